@@ -6,6 +6,12 @@ import ctypes
 import json
 import sys
 import traceback
+import threading
+import itertools
+import multiprocessing
+import queue
+import asyncio
+import concurrent.futures
 try:
     from collections import OrderedDict
 except:
@@ -24,6 +30,16 @@ CURVE_LINEAR  = 0
 CURVE_STEPPED = 1
 CURVE_BEZIER  = 2
 
+# Decode tracing, off by default so library callers (loader, index) stay quiet.
+verbose = False
+
+def log(*args):
+    if verbose:
+        print(*args)
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_PREFETCH    = 10
+
 class AttachmentType(object):
     region = 0
     boundingbox = 1
@@ -179,7 +195,7 @@ class Object(dict):
         try:
             value = self[attr]
         except KeyError:
-            raise AttributeError, attr
+            raise AttributeError(attr)
         return value
 
     def __setattr__(self, attr, value):
@@ -189,8 +205,8 @@ class Object(dict):
         try:
             del self[attr]
         except KeyError:
-            print("key:", attr)
-            raise AttributeError, attr
+            log("key:", attr)
+            raise AttributeError(attr)
 
 def readSkeletonData(input, scale):
     skeletonData = Object()
@@ -202,11 +218,11 @@ def readSkeletonData(input, scale):
 
     nonessential = input.readBoolean()
     if nonessential:
-        print "nonessential:", nonessential
+        log("nonessential:", nonessential)
         skeletonData.imgPath = input.readString()
 
     bonesCount = input.readInt(True)
-    print("bonesCount:", bonesCount)
+    log("bonesCount:", bonesCount)
     skeletonData.bones = []
     for i in range(bonesCount):
         name = input.readString()
@@ -232,10 +248,10 @@ def readSkeletonData(input, scale):
         skeletonData.bones.append(boneData)
 
     ikCount = input.readInt(True)
-    print("ikCount:", ikCount)
+    log("ikCount:", ikCount)
     skeletonData.ik = [None] * ikCount
     for i in range(ikCount):
-        print("ik:", i)
+        log("ik:", i)
         ikData = Object()
 
         name = input.readString()
@@ -254,7 +270,7 @@ def readSkeletonData(input, scale):
         skeletonData.ik[i] = ikData
 
     slotsCount = input.readInt(True)
-    print("slotsCount:", slotsCount)
+    log("slotsCount:", slotsCount)
     skeletonData.slots = [None] * slotsCount
     for i in range(slotsCount):
         slotData = Object()
@@ -282,7 +298,7 @@ def readSkeletonData(input, scale):
         skeletonData.skinsList.append(skin)
 
     eventCount = input.readInt(True)
-    print("eventCount:", eventCount)
+    log("eventCount:", eventCount)
     skeletonData.events = []
     for i in range(eventCount):
         eventData = Object()
@@ -293,11 +309,13 @@ def readSkeletonData(input, scale):
         skeletonData.events.append(eventData)
 
     animationsCount = input.readInt(True)
-    print("animationsCount:", animationsCount)
+    log("animationsCount:", animationsCount)
     skeletonData.animations = []
     for i in range(animationsCount):
         animationName = input.readString()
         if not readAnimation(animationName, input, skeletonData, scale):
+            # The rest of the stream can't be trusted, keep what was read.
+            skeletonData.failedAnimation = animationName
             break
 
     return skeletonData
@@ -317,6 +335,7 @@ def readSkin(input, name, nonessential, scale):
             attachmentName = input.readString()
             attachment = readAttachment(input, skinData, attachmentName, nonessential, scale)
             attachment.slotIndex = slotIndex
+            attachment.attachmentName = attachmentName
 
             skinData[attachmentName] = attachment
             skinData.attachments.append(skinData[attachmentName])
@@ -408,14 +427,14 @@ def readAttachment(input, skin, attachmentName, nonessential, scale):
 
 def readAnimation(name, input, skeletonData, scale):
     ok = True
-    print("readAnimation:", name)
+    log("readAnimation:", name)
     timelines = []
 
     duration = 0
 
     try:
         # Slot timelines.
-        print("Slot timelines.")
+        log("Slot timelines.")
         for i in range(input.readInt(True)):
             slotIndex = input.readInt(True)
             for ii in range(input.readInt(True)):
@@ -452,7 +471,7 @@ def readAnimation(name, input, skeletonData, scale):
                         duration = max(duration, timeline.frames[-1])
 
         # Bone timelines
-        print("Bone timelines")
+        log("Bone timelines")
         boneTimelineCount = input.readInt(True)
         for i in range(boneTimelineCount):
             #print("bone timeline index:", i, boneTimelineCount)
@@ -509,7 +528,7 @@ def readAnimation(name, input, skeletonData, scale):
                         duration = max(duration, timeline.times[-1])
 
         # IK timelines.
-        print("IK timelines.")
+        log("IK timelines.")
         for i in range(input.readInt(True)):
             ikIndex = input.readInt(True)
             ikConstraint = skeletonData.ik[ikIndex]
@@ -533,7 +552,7 @@ def readAnimation(name, input, skeletonData, scale):
                 duration = max(duration, timeline.times[-1])
 
         # FFD timelines.
-        print("FFD timelines.")
+        log("FFD timelines.")
         for i in range(input.readInt(True)):
             skinIndex = input.readInt(True)
             skin = skeletonData.skinsList[skinIndex]
@@ -542,7 +561,7 @@ def readAnimation(name, input, skeletonData, scale):
                 for iii in range(input.readInt(True)):
                     attachmentName = input.readString()
                     #print(attachmentName, [{"name": a.name, "slotIndex": a.slotIndex} for a in skin.attachments])
-                    attachment = filter(lambda item: item.name == attachmentName and item.slotIndex == slotIndex, skin.attachments)[0]
+                    attachment = [item for item in skin.attachments if item.name == attachmentName and item.slotIndex == slotIndex][0]
                     #print("attachment:", attachment)
                     frameCount = input.readInt(True)
                     timeline = Object()
@@ -559,7 +578,7 @@ def readAnimation(name, input, skeletonData, scale):
                         if attachment.type == "mesh":
                             vertexCount = len(attachment.vertices)
                         else:
-                            vertexCount = len(attachment.vertices) / 3 * 2
+                            vertexCount = len(attachment.vertices) // 3 * 2
 
                         end = input.readInt(True)
                         if end == 0:
@@ -588,7 +607,7 @@ def readAnimation(name, input, skeletonData, scale):
 
         # Draw order timeline.        
         drawOrderCount = input.readInt(True)
-        print("Draw order timeline.", drawOrderCount)
+        log("Draw order timeline.", drawOrderCount)
         if drawOrderCount > 0:
             timeline = Object()
             timeline.times = []
@@ -626,7 +645,7 @@ def readAnimation(name, input, skeletonData, scale):
                 duration = max(duration, timeline.times[-1])
 
         # Event timeline.
-        print("Event timeline.")
+        log("Event timeline.")
         eventCount = input.readInt(True)
         if eventCount > 0:
             timeline = Object()
@@ -647,7 +666,7 @@ def readAnimation(name, input, skeletonData, scale):
 
                 timeline.times.append(time)
                 timeline.events.append(event)
-                print("animation Event:", name, time, event, eventData)
+                log("animation Event:", name, time, event, eventData)
 
             timelines.append(timeline)
             if frameCount > 0:
@@ -655,8 +674,9 @@ def readAnimation(name, input, skeletonData, scale):
 
 
     except Exception as e:
-        print(e)
-        traceback.print_exc(file=sys.stdout)
+        log(e)
+        if verbose:
+            traceback.print_exc(file=sys.stdout)
         ok = False
 
     skeletonData.animations.append(Object(animationName = name, timelines = timelines))
@@ -675,17 +695,358 @@ def readCurve(input):
             input.readFloat(),
         )
 
-#filename = "/Users/lqefn/Documents/code/spine-runtimes/spine-libgdx/spine-libgdx-tests/assets/spineboy/spineboy.skel"
-spine_dirs = ["/Users/lqefn/Documents/work/ccplaying/Client/d1/res/image/spine/hero", "/Users/lqefn/Documents/work/ccplaying/Client/d1/res/image/spine/monster"]
-for d in spine_dirs:
-    subDirs = os.listdir(d)
-    for subDir in subDirs:
-        path = os.path.join(d, subDir, "skeleton.skel")
-        if os.path.exists(path):
+def decodeSkeleton(path, scale):
+    input = DataInput(path)
+    return readSkeletonData(input, scale)
+
+class _LoadJob(object):
+    def __init__(self, key, priority):
+        self.key = key
+        self.priority = priority
+        self.waiters = []
+        self.started = False
+        self.cancelled = False
+
+class SkeletonLoader(object):
+    # Decodes skeletons in a bounded pool of worker processes and hands the
+    # results back to asyncio. Queueing, request merging and cancellation stay
+    # in this process. Concurrent requests for the same (path, scale) share
+    # one parse, so callers must treat the returned data as read-only.
+    def __init__(self, workers = 4, executor = None):
+        if executor is None:
+            # Worker processes start lazily from a dispatcher thread, so fork
+            # would copy a multi-threaded parent; spawn avoids that.
+            executor = concurrent.futures.ProcessPoolExecutor(max_workers = workers,
+                                                              mp_context = multiprocessing.get_context("spawn"))
+        self.executor = executor
+        self.queue = queue.PriorityQueue()
+        self.lock = threading.Lock()
+        self.jobs = {}
+        self.counter = itertools.count()
+        self.threads = []
+        for i in range(workers):
+            thread = threading.Thread(target = self._work)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def load(self, path, scale = 1.0, priority = PRIORITY_INTERACTIVE):
+        # Call from a coroutine. Lower priority values run first. Returns an
+        # asyncio future; cancelling it drops the parse if no other caller is
+        # still waiting for it.
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        key = (os.path.abspath(path), scale)
+        with self.lock:
+            job = self.jobs.get(key)
+            if job is None:
+                job = _LoadJob(key, priority)
+                self.jobs[key] = job
+                self.queue.put((priority, next(self.counter), job))
+            elif priority < job.priority and not job.started:
+                # Queue again at the better priority, the stale entry is skipped.
+                job.priority = priority
+                self.queue.put((priority, next(self.counter), job))
+            job.waiters.append((loop, future))
+        future.add_done_callback(lambda f: self._onWaiterDone(job, f))
+        return future
+
+    def shutdown(self):
+        # Pending jobs are cancelled, jobs already decoding still deliver.
+        waiters = []
+        with self.lock:
+            for key, job in list(self.jobs.items()):
+                if job.started:
+                    continue
+                job.cancelled = True
+                del self.jobs[key]
+                waiters.extend(job.waiters)
+                job.waiters = []
+        for loop, future in waiters:
             try:
-                print("read:(%s)" % subDir)
-                input = DataInput(path)
-                readSkeletonData(input, 1.0)
-            except Exception as e:
-                print("read(%s) fail" % path, e)
+                loop.call_soon_threadsafe(future.cancel)
+            except RuntimeError:
+                continue
+
+        self.executor.shutdown(wait = False, cancel_futures = True)
+        for thread in self.threads:
+            self.queue.put((float("-inf"), next(self.counter), None))
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+    def _onWaiterDone(self, job, future):
+        if not future.cancelled():
+            return
+        with self.lock:
+            job.waiters = [w for w in job.waiters if w[1] is not future]
+            if not job.waiters and not job.started:
+                job.cancelled = True
+                if self.jobs.get(job.key) is job:
+                    del self.jobs[job.key]
+
+    def _work(self):
+        while True:
+            priority, seq, job = self.queue.get()
+            if job is None:
+                break
+            try:
+                self._run(job)
+            except Exception:
                 traceback.print_exc()
+
+    def _run(self, job):
+        with self.lock:
+            if job.started or job.cancelled:
+                return
+            job.started = True
+
+        result = None
+        error = None
+        try:
+            result = self.executor.submit(decodeSkeleton, job.key[0], job.key[1]).result()
+        except Exception as e:
+            error = e
+
+        with self.lock:
+            if self.jobs.get(job.key) is job:
+                del self.jobs[job.key]
+            waiters = job.waiters
+            job.waiters = []
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(self._resolve, future, result, error)
+            except RuntimeError:
+                # The waiter's event loop has been closed, nobody is listening.
+                continue
+
+    @staticmethod
+    def _resolve(future, result, error):
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+_defaultLoader = None
+
+def load_skeleton(path, scale = 1.0, priority = PRIORITY_INTERACTIVE):
+    global _defaultLoader
+    if _defaultLoader is None:
+        _defaultLoader = SkeletonLoader()
+    return _defaultLoader.load(path, scale, priority)
+
+INDEX_VERSION = 2
+INDEX_KINDS = ["bone", "slot", "skin", "attachment", "attachmentPath", "attachmentType", "event", "animation"]
+
+def indexSkeletonData(skeletonData):
+    if "failedAnimation" in skeletonData:
+        raise ValueError("animation %r failed to decode" % skeletonData.failedAnimation)
+
+    entries = dict((kind, set()) for kind in INDEX_KINDS)
+    skins = {}
+    for boneData in skeletonData.bones:
+        entries["bone"].add(boneData.name)
+    for slotData in skeletonData.slots:
+        entries["slot"].add(slotData.name)
+    for skinName, skin in skeletonData.skins.items():
+        entries["skin"].add(skinName)
+        skins[skinName] = []
+        if skin is None:
+            # readSkin returns None for a skin without slots.
+            continue
+        for attachment in skin.attachments:
+            # Slots and timelines refer to the skin key, which can differ
+            # from an explicit attachment name; index both.
+            for name in (attachment.attachmentName, attachment.name):
+                entries["attachment"].add(name)
+                if name not in skins[skinName]:
+                    skins[skinName].append(name)
+            entries["attachmentType"].add(attachment.type)
+            if "path" in attachment:
+                entries["attachmentPath"].add(attachment.path)
+    for eventData in skeletonData.events:
+        entries["event"].add(eventData.name)
+    for animation in skeletonData.animations:
+        entries["animation"].add(animation.animationName)
+
+    return {
+        "entries": dict((kind, sorted(values)) for kind, values in entries.items()),
+        "skins": skins,
+    }
+
+class SkeletonIndex(object):
+    # Inverted index from bone/slot/skin/attachment/event/animation names to
+    # the skeleton files that use them. Files are re-parsed only when their
+    # mtime or size changes. Files that fail to parse are listed in `failed`
+    # (path -> error) and retried on the next update().
+    def __init__(self):
+        self.files = {}
+        self.failed = {}
+        self.postings = dict((kind, {}) for kind in INDEX_KINDS)
+
+    @classmethod
+    def load(cls, filename):
+        index = cls()
+        if not os.path.exists(filename):
+            return index
+        with open(filename, "r") as f:
+            data = json.load(f)
+        if data.get("version") != INDEX_VERSION:
+            return index
+        index.files = data["files"]
+        for kind in INDEX_KINDS:
+            postings = data["postings"].get(kind, {})
+            index.postings[kind] = dict((value, set(paths)) for value, paths in postings.items())
+        return index
+
+    def save(self, filename):
+        data = {
+            "version": INDEX_VERSION,
+            "files": self.files,
+            "postings": dict((kind, dict((value, sorted(paths)) for value, paths in postings.items()))
+                             for kind, postings in self.postings.items()),
+        }
+        tmp = filename + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, filename)
+
+    def update(self, dirs, skelName = "skeleton.skel"):
+        # Returns the number of files added, re-indexed, dropped or removed;
+        # files that failed to parse are in self.failed instead. Decode bytes
+        # roots so walked paths match the text keys from json.load.
+        dirs = [os.path.abspath(os.fsdecode(d)) for d in dirs]
+        seen = set()
+        changed = 0
+        for d in dirs:
+            for root, subDirs, files in os.walk(d):
+                if skelName not in files:
+                    continue
+                path = os.path.join(root, skelName)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    # Deleted since the walk listed it, handled as removed below.
+                    continue
+                seen.add(path)
+                record = self.files.get(path)
+                if record is not None and record["mtime"] == st.st_mtime and record["size"] == st.st_size:
+                    continue
+                self._remove(path)
+                if self._add(path, st) or record is not None:
+                    changed += 1
+
+        roots = [os.path.join(d, "") for d in dirs]
+        for path in list(self.files.keys()) + list(self.failed.keys()):
+            if path not in seen and any(path.startswith(root) for root in roots):
+                if path in self.files:
+                    changed += 1
+                self._remove(path)
+        return changed
+
+    def lookup(self, kind, value):
+        return sorted(self.postings[kind].get(value, ()))
+
+    def skinsWithAttachment(self, attachmentName):
+        result = []
+        for path in self.lookup("attachment", attachmentName):
+            for skinName, attachments in sorted(self.files[path]["skins"].items()):
+                if attachmentName in attachments:
+                    result.append((path, skinName))
+        return result
+
+    def _add(self, path, st):
+        try:
+            record = indexSkeletonData(decodeSkeleton(path, 1.0))
+        except Exception as e:
+            log("index(%s) fail" % path, e)
+            self.failed[path] = "%s: %s" % (type(e).__name__, e)
+            return False
+
+        record["mtime"] = st.st_mtime
+        record["size"] = st.st_size
+        self.files[path] = record
+        for kind, values in record["entries"].items():
+            postings = self.postings[kind]
+            for value in values:
+                postings.setdefault(value, set()).add(path)
+        return True
+
+    def _remove(self, path):
+        self.failed.pop(path, None)
+        record = self.files.pop(path, None)
+        if record is None:
+            return
+        for kind, values in record["entries"].items():
+            postings = self.postings[kind]
+            for value in values:
+                paths = postings.get(value)
+                if paths is None:
+                    continue
+                paths.discard(path)
+                if not paths:
+                    del postings[value]
+
+#filename = "/Users/lqefn/Documents/code/spine-runtimes/spine-libgdx/spine-libgdx-tests/assets/spineboy/spineboy.skel"
+spine_dirs = ["/Users/lqefn/Documents/work/ccplaying/Client/d1/res/image/spine/hero", "/Users/lqefn/Documents/work/ccplaying/Client/d1/res/image/spine/monster"]
+
+def decodeDirs(dirs):
+    for d in dirs:
+        subDirs = os.listdir(d)
+        for subDir in subDirs:
+            path = os.path.join(d, subDir, "skeleton.skel")
+            if os.path.exists(path):
+                try:
+                    print("read:(%s)" % subDir)
+                    input = DataInput(path)
+                    readSkeletonData(input, 1.0)
+                except Exception as e:
+                    print("read(%s) fail" % path, e)
+                    traceback.print_exc()
+
+def main(argv):
+    # skeleton.py                            decode every skeleton under spine_dirs
+    # skeleton.py index INDEX [DIR...]       build or update INDEX
+    # skeleton.py lookup INDEX KIND VALUE    files using VALUE, KIND in INDEX_KINDS
+    # skeleton.py skins INDEX ATTACHMENT     (file, skin) pairs containing ATTACHMENT
+    global verbose
+    import argparse
+    parser = argparse.ArgumentParser(prog = "skeleton.py")
+    commands = parser.add_subparsers(dest = "command")
+    decode = commands.add_parser("decode")
+    decode.add_argument("dirs", nargs = "*", default = spine_dirs)
+    index = commands.add_parser("index")
+    index.add_argument("index")
+    index.add_argument("dirs", nargs = "*", default = spine_dirs)
+    lookup = commands.add_parser("lookup")
+    lookup.add_argument("index")
+    lookup.add_argument("kind", choices = INDEX_KINDS)
+    lookup.add_argument("value")
+    skins = commands.add_parser("skins")
+    skins.add_argument("index")
+    skins.add_argument("attachment")
+    args = parser.parse_args(argv or ["decode"])
+
+    if args.command == "decode":
+        verbose = True
+        decodeDirs(args.dirs)
+    elif args.command == "index":
+        skeletonIndex = SkeletonIndex.load(args.index)
+        changed = skeletonIndex.update(args.dirs)
+        skeletonIndex.save(args.index)
+        print("indexed %d files, %d changed" % (len(skeletonIndex.files), changed))
+        for path, error in sorted(skeletonIndex.failed.items()):
+            print("failed: %s (%s)" % (path, error))
+        return 1 if skeletonIndex.failed else 0
+    elif args.command == "lookup":
+        for path in SkeletonIndex.load(args.index).lookup(args.kind, args.value):
+            print(path)
+    elif args.command == "skins":
+        for path, skinName in SkeletonIndex.load(args.index).skinsWithAttachment(args.attachment):
+            print("%s\t%s" % (path, skinName))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,129 @@
+import os
+import struct
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class SkelWriter(object):
+    # Mirror of DataInput, just enough to build small binary fixtures.
+    def __init__(self):
+        self.data = bytearray()
+
+    def byte(self, value):
+        self.data.append(value)
+
+    def boolean(self, value):
+        self.byte(1 if value else 0)
+
+    def float(self, value):
+        self.data += struct.pack(">f", value)
+
+    def uint(self, value):
+        self.data += struct.pack(">I", value)
+
+    def varint(self, value, optimizePositive = True):
+        if not optimizePositive:
+            value = (value << 1) ^ (value >> 31)
+        while True:
+            b = value & 0x7F
+            value >>= 7
+            if value:
+                self.byte(b | 0x80)
+            else:
+                self.byte(b)
+                return
+
+    def string(self, value):
+        if value is None:
+            self.varint(0)
+            return
+        self.varint(len(value) + 1)
+        self.data += value.encode("ascii")
+
+
+def buildSkel(bones = ("root",), slots = (), skins = None, events = (), animations = ()):
+    # slots: [(name, boneIndex)], skins: {skinName: [(slotIndex, key, path)]}
+    # or (slotIndex, key, path, name) for an explicit attachment name, with
+    # "default" written first; an empty list writes a skin with no slots.
+    w = SkelWriter()
+    w.string("hash")
+    w.string("2.1.27")
+    w.float(100.0)
+    w.float(200.0)
+    w.boolean(False)
+
+    w.varint(len(bones))
+    for i, name in enumerate(bones):
+        w.string(name)
+        w.varint(0 if i == 0 else 1)
+        for v in range(6):
+            w.float(1.0)
+        for v in range(4):
+            w.boolean(False)
+
+    w.varint(0)
+
+    w.varint(len(slots))
+    for name, boneIndex in slots:
+        w.string(name)
+        w.varint(boneIndex)
+        w.uint(0xffffffff)
+        w.string(None)
+        w.boolean(False)
+
+    skins = dict(skins or {})
+
+    def writeSkin(attachments):
+        bySlot = {}
+        for attachment in attachments:
+            slotIndex, key, path = attachment[:3]
+            name = attachment[3] if len(attachment) > 3 else None
+            bySlot.setdefault(slotIndex, []).append((key, path, name))
+        w.varint(len(bySlot))
+        for slotIndex, items in sorted(bySlot.items()):
+            w.varint(slotIndex)
+            w.varint(len(items))
+            for key, path, name in items:
+                w.string(key)
+                w.string(name)
+                w.byte(0)
+                w.string(path)
+                for v in range(7):
+                    w.float(1.0)
+                w.uint(0xffffffff)
+
+    writeSkin(skins.pop("default", []))
+    w.varint(len(skins))
+    for skinName in sorted(skins):
+        w.string(skinName)
+        writeSkin(skins[skinName])
+
+    w.varint(len(events))
+    for name in events:
+        w.string(name)
+        w.varint(0, False)
+        w.float(0.0)
+        w.string(None)
+
+    w.varint(len(animations))
+    for name in animations:
+        w.string(name)
+        for v in range(6):
+            w.varint(0)
+
+    return bytes(w.data)
+
+
+@pytest.fixture
+def writeSkel():
+    def write(path, **kwargs):
+        d = os.path.dirname(str(path))
+        if not os.path.isdir(d):
+            os.makedirs(d)
+        with open(str(path), "wb") as f:
+            f.write(buildSkel(**kwargs))
+        return str(path)
+    return write
@@ -0,0 +1,196 @@
+import os
+
+import skeleton
+
+
+def heroTree(tmp_path, writeSkel):
+    a = writeSkel(tmp_path / "hero" / "a" / "skeleton.skel",
+                  bones = ("root", "head"),
+                  slots = (("body", 0), ("face", 1)),
+                  skins = {"default": [(0, "body", "tex/body_a")], "red": [(1, "hat", "tex/hat")]},
+                  events = ("hit",),
+                  animations = ("idle", "attack"))
+    b = writeSkel(tmp_path / "monster" / "b" / "skeleton.skel",
+                  bones = ("root",),
+                  slots = (("body", 0),),
+                  skins = {"default": [(0, "body", "tex/body_b")], "blue": [(0, "hat", "tex/hat")]},
+                  events = ("roar",),
+                  animations = ("idle",))
+    return a, b
+
+
+def test_update_and_lookup(tmp_path, writeSkel):
+    a, b = heroTree(tmp_path, writeSkel)
+    index = skeleton.SkeletonIndex()
+
+    assert index.update([str(tmp_path / "hero"), str(tmp_path / "monster")]) == 2
+    assert index.lookup("bone", "root") == sorted([a, b])
+    assert index.lookup("bone", "head") == [a]
+    assert index.lookup("slot", "face") == [a]
+    assert index.lookup("skin", "blue") == [b]
+    assert index.lookup("attachmentPath", "tex/hat") == sorted([a, b])
+    assert index.lookup("attachmentType", "region") == sorted([a, b])
+    assert index.lookup("event", "roar") == [b]
+    assert index.lookup("animation", "attack") == [a]
+    assert index.lookup("event", "missing") == []
+    assert index.skinsWithAttachment("hat") == sorted([(a, "red"), (b, "blue")])
+
+
+def test_update_is_quiet(tmp_path, writeSkel, capsys):
+    heroTree(tmp_path, writeSkel)
+    skeleton.SkeletonIndex().update([str(tmp_path)])
+    assert capsys.readouterr().out == ""
+
+
+def test_update_is_incremental(tmp_path, writeSkel, monkeypatch):
+    a, b = heroTree(tmp_path, writeSkel)
+    index = skeleton.SkeletonIndex()
+    index.update([str(tmp_path)])
+
+    decoded = []
+    decode = skeleton.decodeSkeleton
+    monkeypatch.setattr(skeleton, "decodeSkeleton", lambda path, scale: decoded.append(path) or decode(path, scale))
+
+    assert index.update([str(tmp_path)]) == 0
+    assert decoded == []
+
+    writeSkel(a, bones = ("root", "tail"), events = ("hit", "step"))
+    os.utime(a, (1, 1))
+    assert index.update([str(tmp_path)]) == 1
+    assert decoded == [a]
+    assert index.lookup("bone", "head") == []
+    assert index.lookup("bone", "tail") == [a]
+    assert index.lookup("event", "step") == [a]
+
+
+def test_deleted_files_are_removed(tmp_path, writeSkel):
+    a, b = heroTree(tmp_path, writeSkel)
+    index = skeleton.SkeletonIndex()
+    index.update([str(tmp_path)])
+
+    os.remove(a)
+    assert index.update([str(tmp_path)]) == 1
+    assert a not in index.files
+    assert index.lookup("animation", "attack") == []
+    assert index.lookup("bone", "root") == [b]
+    assert index.skinsWithAttachment("hat") == [(b, "blue")]
+
+
+def test_save_load_round_trip(tmp_path, writeSkel):
+    a, b = heroTree(tmp_path, writeSkel)
+    filename = str(tmp_path / "index.json")
+    index = skeleton.SkeletonIndex()
+    index.update([str(tmp_path)])
+    index.save(filename)
+    index.save(filename)
+
+    loaded = skeleton.SkeletonIndex.load(filename)
+    assert loaded.files == index.files
+    assert loaded.postings == index.postings
+    assert loaded.update([str(tmp_path)]) == 0
+    assert loaded.skinsWithAttachment("hat") == index.skinsWithAttachment("hat")
+
+
+def test_skin_without_slots_is_indexed(tmp_path, writeSkel):
+    path = writeSkel(tmp_path / "a" / "skeleton.skel",
+                     bones = ("root",),
+                     skins = {"default": [], "empty": []},
+                     events = ("hit",))
+    index = skeleton.SkeletonIndex()
+    index.update([str(tmp_path)])
+
+    assert index.failed == {}
+    assert index.lookup("skin", "empty") == [path]
+    assert index.lookup("event", "hit") == [path]
+    assert index.files[path]["skins"] == {"empty": []}
+
+
+def test_failed_files_are_reported_and_retried(tmp_path, writeSkel):
+    bad = str(tmp_path / "bad" / "skeleton.skel")
+    os.makedirs(os.path.dirname(bad))
+    with open(bad, "wb") as f:
+        f.write(b"\x05ab")
+
+    index = skeleton.SkeletonIndex()
+    assert index.update([str(tmp_path)]) == 0
+    assert list(index.failed) == [bad]
+    assert bad not in index.files
+
+    writeSkel(bad, bones = ("root",))
+    assert index.update([str(tmp_path)]) == 1
+    assert index.failed == {}
+    assert index.lookup("bone", "root") == [bad]
+
+
+def test_attachment_indexed_by_skin_key_and_name(tmp_path, writeSkel):
+    path = writeSkel(tmp_path / "a" / "skeleton.skel",
+                     slots = (("body", 0),),
+                     skins = {"default": [(0, "body", "tex/body", "body_v2")]})
+    index = skeleton.SkeletonIndex()
+    index.update([str(tmp_path)])
+
+    assert index.lookup("attachment", "body") == [path]
+    assert index.lookup("attachment", "body_v2") == [path]
+    assert index.skinsWithAttachment("body") == [(path, "default")]
+    assert index.files[path]["skins"] == {"default": ["body", "body_v2"]}
+
+
+def test_truncated_animation_is_a_failure(tmp_path, writeSkel):
+    path = writeSkel(tmp_path / "a" / "skeleton.skel", animations = ("idle", "run", "attack"))
+    with open(path, "rb") as f:
+        data = f.read()
+    # Each animation is its name followed by six empty timeline counts; cut
+    # "attack" and the tail of "run".
+    with open(path, "wb") as f:
+        f.write(data[:-(1 + len("attack") + 6) - 3])
+
+    index = skeleton.SkeletonIndex()
+    assert index.update([str(tmp_path)]) == 0
+    assert list(index.failed) == [path]
+    assert "run" in index.failed[path]
+    assert path not in index.files
+    assert index.lookup("animation", "idle") == []
+
+
+def test_indexed_file_that_now_fails_counts_as_changed(tmp_path, writeSkel):
+    a, b = heroTree(tmp_path, writeSkel)
+    index = skeleton.SkeletonIndex()
+    index.update([str(tmp_path)])
+
+    with open(a, "wb") as f:
+        f.write(b"\x05ab")
+    assert index.update([str(tmp_path)]) == 1
+    assert list(index.failed) == [a]
+    assert a not in index.files
+    assert index.lookup("animation", "attack") == []
+
+
+def test_file_deleted_during_walk_is_treated_as_removed(tmp_path, writeSkel, monkeypatch):
+    a, b = heroTree(tmp_path, writeSkel)
+    index = skeleton.SkeletonIndex()
+    index.update([str(tmp_path)])
+
+    stat = os.stat
+    def racyStat(path, *args, **kwargs):
+        if path == a:
+            raise FileNotFoundError(path)
+        return stat(path, *args, **kwargs)
+    monkeypatch.setattr(skeleton.os, "stat", racyStat)
+
+    assert index.update([str(tmp_path)]) == 1
+    assert a not in index.files
+    assert index.lookup("bone", "root") == [b]
+
+
+def test_cli_index_and_lookup(tmp_path, writeSkel, capsys):
+    a, b = heroTree(tmp_path, writeSkel)
+    filename = str(tmp_path / "index.json")
+
+    assert skeleton.main(["index", filename, str(tmp_path / "hero"), str(tmp_path / "monster")]) == 0
+    capsys.readouterr()
+
+    skeleton.main(["lookup", filename, "event", "hit"])
+    assert capsys.readouterr().out.split() == [a]
+
+    skeleton.main(["skins", filename, "hat"])
+    assert capsys.readouterr().out.splitlines() == ["%s\tred" % a, "%s\tblue" % b]
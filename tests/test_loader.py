@@ -0,0 +1,178 @@
+import asyncio
+import concurrent.futures
+import threading
+
+import pytest
+
+import skeleton
+
+
+class StubDecoder(object):
+    def __init__(self):
+        self.calls = []
+        self.gate = threading.Event()
+
+    def __call__(self, path, scale):
+        self.calls.append(path)
+        self.gate.wait(5)
+        if "bad" in path:
+            raise ValueError("bad skeleton")
+        return skeleton.Object(path = path, scale = scale)
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    decoder = StubDecoder()
+    monkeypatch.setattr(skeleton, "decodeSkeleton", decoder)
+    return decoder
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def threadLoader(workers = 1):
+    return skeleton.SkeletonLoader(workers, concurrent.futures.ThreadPoolExecutor(workers))
+
+
+async def settle(stub, count):
+    while len(stub.calls) < count:
+        await asyncio.sleep(0.01)
+
+
+def test_concurrent_requests_share_one_decode(stub):
+    loader = threadLoader()
+
+    async def main():
+        a = loader.load("x")
+        b = loader.load("x")
+        stub.gate.set()
+        return await asyncio.gather(a, b)
+
+    a, b = run(main())
+    loader.shutdown()
+    assert a is b
+    assert len(stub.calls) == 1
+
+
+def test_interactive_requests_run_before_prefetch(stub):
+    loader = threadLoader()
+
+    async def main():
+        first = loader.load("first")
+        await settle(stub, 1)
+        background = loader.load("background", priority = skeleton.PRIORITY_PREFETCH)
+        interactive = loader.load("interactive")
+        stub.gate.set()
+        await asyncio.gather(first, background, interactive)
+
+    run(main())
+    loader.shutdown()
+    assert [p.rsplit("/", 1)[-1] for p in stub.calls] == ["first", "interactive", "background"]
+
+
+def test_priority_bump_for_pending_job(stub):
+    loader = threadLoader()
+
+    async def main():
+        first = loader.load("first")
+        await settle(stub, 1)
+        other = loader.load("other", priority = 5)
+        bumped = loader.load("bumped", priority = skeleton.PRIORITY_PREFETCH)
+        again = loader.load("bumped", priority = skeleton.PRIORITY_INTERACTIVE)
+        stub.gate.set()
+        await asyncio.gather(first, other, bumped, again)
+
+    run(main())
+    loader.shutdown()
+    assert [p.rsplit("/", 1)[-1] for p in stub.calls] == ["first", "bumped", "other"]
+
+
+def test_cancelled_pending_job_is_dropped(stub):
+    loader = threadLoader()
+
+    async def main():
+        first = loader.load("first")
+        await settle(stub, 1)
+        dropped = loader.load("dropped")
+        dropped.cancel()
+        await asyncio.sleep(0)
+        stub.gate.set()
+        await first
+
+    run(main())
+    loader.shutdown()
+    assert [p.rsplit("/", 1)[-1] for p in stub.calls] == ["first"]
+
+
+def test_error_is_shared_by_all_waiters(stub):
+    loader = threadLoader()
+
+    async def main():
+        a = loader.load("bad")
+        b = loader.load("bad")
+        stub.gate.set()
+        return await asyncio.gather(a, b, return_exceptions = True)
+
+    a, b = run(main())
+    loader.shutdown()
+    assert isinstance(a, ValueError) and a is b
+    assert len(stub.calls) == 1
+
+
+def test_process_pool_decodes_real_file(tmp_path, writeSkel):
+    path = writeSkel(tmp_path / "hero" / "skeleton.skel", bones = ("root", "head"), events = ("hit",))
+    loader = skeleton.SkeletonLoader(workers = 1)
+
+    async def main():
+        return await loader.load(path, 2.0)
+
+    data = run(main())
+    loader.shutdown()
+    assert isinstance(data, skeleton.Object)
+    assert [b.name for b in data.bones] == ["root", "head"]
+    assert data.bones[0].x == 2.0
+    assert data.events[0].name == "hit"
+
+
+def test_closed_waiter_loop_does_not_kill_worker(stub):
+    loader = threadLoader()
+
+    async def fireAndForget():
+        loader.load("prefetch", priority = skeleton.PRIORITY_PREFETCH)
+        await settle(stub, 1)
+
+    run(fireAndForget())
+    stub.gate.set()
+
+    async def main():
+        return await asyncio.wait_for(loader.load("next"), 5)
+
+    data = run(main())
+    loader.shutdown()
+    assert data.path.endswith("next")
+    assert [p.rsplit("/", 1)[-1] for p in stub.calls] == ["prefetch", "next"]
+
+
+def test_shutdown_cancels_pending_jobs(stub):
+    loader = threadLoader()
+
+    async def main():
+        first = loader.load("first")
+        await settle(stub, 1)
+        pending = [loader.load(name, priority = skeleton.PRIORITY_PREFETCH) for name in ("a", "b", "c")]
+        stopping = asyncio.get_running_loop().run_in_executor(None, loader.shutdown)
+        await asyncio.sleep(0.05)
+        stub.gate.set()
+        await stopping
+        results = await asyncio.gather(first, *pending, return_exceptions = True)
+        return results
+
+    results = run(main())
+    assert results[0].path.endswith("first")
+    assert all(isinstance(r, asyncio.CancelledError) for r in results[1:])
+    assert [p.rsplit("/", 1)[-1] for p in stub.calls] == ["first"]